@@ -1,21 +1,34 @@
 import base64
+import concurrent.futures
+import hashlib
 import io
 import json
-import mimetypes
 import os
+import re
+import tempfile
+import threading
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional, Tuple
 
+import httpx
 import pandas as pd
 from PIL import Image
 import streamlit as st
 from dotenv import load_dotenv
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential
+import diskcache
 
 try:
     from openai import OpenAI
 except Exception:  # pragma: no cover
     OpenAI = None  # type: ignore
 
+try:
+    # Decoder em C, ~3-5x mais rápido que o json puro-Python em payloads de alguns KB
+    from orjson import loads as _json_loads
+except Exception:  # pragma: no cover
+    _json_loads = json.loads
+
 
 @dataclass
 class ExtractedProduct:
@@ -59,13 +72,70 @@ Schema JSON alvo:
 """
 ).strip()
 
+INSTRUCTIONS_BATCH_PT = (
+    """
+Você receberá várias imagens numeradas numa única mensagem. Aplique as mesmas regras de extração a cada imagem,
+de forma independente, e retorne apenas JSON no formato:
+{
+  "results": [
+    {"source_index": 0, "products": [ ...mesmo schema de produto acima... ]}
+  ]
+}
+Inclua exatamente um item em "results" por imagem recebida, com o "source_index" indicado no texto que a precede;
+use "products": [] quando a imagem não tiver produtos.
+"""
+).strip()
+
+# Quantas imagens compartilham uma mesma chamada ao modelo (amortiza handshake e prompt)
+BATCH_SIZE = 4
+
+# Versão do prompt entra na chave do cache: mudar as instruções invalida respostas antigas
+PROMPT_HASH = hashlib.md5((INSTRUCTIONS_PT + INSTRUCTIONS_BATCH_PT).encode()).hexdigest()[:8]
+
+# Cache em disco de respostas normalizadas do LLM, chaveado por conteúdo da imagem
+_llm_cache = diskcache.Cache(".llm_cache")
+_LLM_CACHE_TTL_SECONDS = 7 * 86400
+
+
+# O uploader só aceita estas extensões; um dict local evita a inicialização lazy
+# e a caminhada de tabelas do mimetypes.guess_type a cada imagem
+_MIME = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png"}
+
+_LLM_IMAGE_MAX_SIDE = 1024
+_LLM_IMAGE_MIN_BYTES = 200_000
+
+# Remove tudo que não for dígito/vírgula/ponto/sinal de preços textuais ("R$ 1.299,90")
+_PRICE_RE = re.compile(r"[^\d,.-]")
+
+
+def downscale_image_for_llm(image_bytes: bytes) -> Tuple[bytes, bool]:
+    # Modelos de visão consomem tiles de ~768px; pixels além disso só inflam upload e tokens.
+    # Imagens pequenas não valem o custo de re-encodar.
+    if len(image_bytes) <= _LLM_IMAGE_MIN_BYTES:
+        return image_bytes, False
+    try:
+        img = Image.open(io.BytesIO(image_bytes))
+        img.thumbnail((_LLM_IMAGE_MAX_SIDE, _LLM_IMAGE_MAX_SIDE), Image.LANCZOS)
+        buf = io.BytesIO()
+        img.convert("RGB").save(buf, format="JPEG", quality=85, optimize=True)
+        return buf.getvalue(), True
+    except Exception:
+        # Bytes que o PIL não abre seguem como estão; a API valida o formato
+        return image_bytes, False
+
 
-def encode_image_to_data_url(image_bytes: bytes, filename: str) -> Tuple[str, str]:
-    mime, _ = mimetypes.guess_type(filename)
+def encode_image_to_data_url(image_bytes: bytes, filename: str, mime: Optional[str] = None) -> Tuple[str, str]:
     if not mime:
-        mime = "image/jpeg"
-    b64 = base64.b64encode(image_bytes).decode("utf-8")
-    return f"data:{mime};base64,{b64}", mime
+        ext = os.path.splitext(filename)[1].lower()
+        mime = _MIME.get(ext, "image/jpeg")
+    # Escreve prefixo + base64 num buffer pré-dimensionado em vez de concatenar strings,
+    # evitando cópias intermediárias de megabytes no caminho de encode
+    prefix = f"data:{mime};base64,".encode("ascii")
+    encoded = base64.b64encode(memoryview(image_bytes))
+    buf = bytearray(len(prefix) + len(encoded))
+    buf[: len(prefix)] = prefix
+    buf[len(prefix) :] = encoded
+    return buf.decode("ascii"), mime
 
 
 def image_file_to_bytes(file_like) -> bytes:
@@ -88,8 +158,86 @@ def pil_image_to_bytes(img: Image.Image, format_hint: Optional[str] = None) -> b
     return buf.getvalue()
 
 
-def extract_products_from_image(client, model: str, image_bytes: bytes, filename: str) -> List[Dict[str, Any]]:
-    data_url, _ = encode_image_to_data_url(image_bytes, filename)
+# Uploads acima deste tamanho transbordam da memória para disco (SpooledTemporaryFile)
+_UPLOAD_SPOOL_MAX_BYTES = 1_000_000
+
+# Totais de tokens da execução atual, alimentados pelos workers (daí o lock).
+# cached_tokens > 0 confirma que o prompt-caching automático da OpenAI está ativo.
+_usage_lock = threading.Lock()
+_usage_totals = {"prompt_tokens": 0, "cached_tokens": 0}
+
+
+def _reset_usage_totals() -> None:
+    with _usage_lock:
+        _usage_totals["prompt_tokens"] = 0
+        _usage_totals["cached_tokens"] = 0
+
+
+def _record_usage(usage) -> None:
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", 0) or 0
+    with _usage_lock:
+        _usage_totals["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+        _usage_totals["cached_tokens"] += cached
+
+
+def _is_retryable_api_error(exc: BaseException) -> bool:
+    # 429 (rate limit) e 5xx são transitórios; qualquer outro erro deve estourar imediatamente
+    status = getattr(exc, "status_code", None)
+    return status == 429 or (isinstance(status, int) and status >= 500)
+
+
+@retry(
+    retry=retry_if_exception(_is_retryable_api_error),
+    wait=wait_random_exponential(multiplier=1, max=30),
+    stop=stop_after_attempt(5),
+    reraise=True,
+)
+def _create_chat_completion(client, **kwargs):
+    return client.chat.completions.create(**kwargs)
+
+
+def _cache_key(image_bytes: bytes, model: str) -> str:
+    return hashlib.sha256(image_bytes).hexdigest() + ":" + model + ":" + PROMPT_HASH
+
+
+def _image_content_block(image_bytes: bytes, filename: str) -> Dict[str, Any]:
+    image_bytes, reencoded = downscale_image_for_llm(image_bytes)
+    data_url, _ = encode_image_to_data_url(image_bytes, filename, mime="image/jpeg" if reencoded else None)
+    return {"type": "image_url", "image_url": {"url": data_url}}
+
+
+def _stream_chat_content(client, model: str, messages: List[Dict[str, Any]]) -> str:
+    # Streaming sobrepõe o recebimento da resposta ao processamento: os chunks chegam
+    # conforme o modelo gera, em vez de esperar o corpo completo antes do primeiro byte
+    stream = _create_chat_completion(
+        client,
+        model=model,
+        response_format={"type": "json_object"},
+        messages=messages,
+        stream=True,
+        stream_options={"include_usage": True},
+    )
+    chunks: List[str] = []
+    for event in stream:
+        usage = getattr(event, "usage", None)
+        if usage is not None:
+            _record_usage(usage)
+        if event.choices:
+            delta = event.choices[0].delta.content
+            if delta:
+                chunks.append(delta)
+    return "".join(chunks)
+
+
+def extract_products_from_image(
+    client, model: str, image_bytes: bytes, filename: str, use_cache: bool = True
+) -> List[Dict[str, Any]]:
+    cache_key = _cache_key(image_bytes, model)
+    if use_cache:
+        cached = _llm_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
     messages = [
         {
@@ -100,56 +248,55 @@ def extract_products_from_image(client, model: str, image_bytes: bytes, filename
             "role": "user",
             "content": [
                 {"type": "text", "text": "Extraia os produtos desta imagem e retorne apenas o JSON."},
-                {"type": "image_url", "image_url": {"url": data_url}},
+                _image_content_block(image_bytes, filename),
             ],
         },
     ]
 
-    response = client.chat.completions.create(
-        model=model,
-        response_format={"type": "json_object"},
-        messages=messages,
-    )
-    content = response.choices[0].message.content
-    try:
-        payload = json.loads(content)
-    except json.JSONDecodeError:
-        # Try to salvage basic JSON object from text
-        content_stripped = content.strip()
-        start = content_stripped.find("{")
-        end = content_stripped.rfind("}")
-        if start != -1 and end != -1:
-            payload = json.loads(content_stripped[start : end + 1])
-        else:
-            payload = {"products": []}
+    content = _stream_chat_content(client, model, messages)
+    # Com response_format=json_object a API garante um objeto JSON válido;
+    # o antigo resgate via find/rfind era código morto varrendo a string inteira
+    payload = _json_loads(content) if content else {"products": []}
+
+    normalized = _normalize_products(payload.get("products", []) or [])
 
-    products = payload.get("products", []) or []
+    # Não cacheia payloads vazios: podem ser falha transitória do modelo
+    if use_cache and normalized:
+        _llm_cache.set(cache_key, normalized, expire=_LLM_CACHE_TTL_SECONDS)
+
+    return normalized
+
+
+def _normalize_products(products: List[Any]) -> List[Dict[str, Any]]:
     normalized: List[Dict[str, Any]] = []
+    append = normalized.append
     for p in products:
-        # Normalize fields and types
-        marca_nome = p.get("marca_nome") or p.get("marca+nome") or p.get("nome") or ""
-        marca = p.get("marca") or ""
-        produto = p.get("produto") or ""
-        preco_brl_val = p.get("preco_brl")
-        preco_brl_texto = p.get("preco_brl_texto") or p.get("preco_texto") or ""
+        # Normalize fields and types; bind .get uma vez por produto em vez de
+        # resolver o método a cada chave do fallback
+        get = p.get
+        marca_nome = get("marca_nome") or get("marca+nome") or get("nome") or ""
+        marca = get("marca") or ""
+        produto = get("produto") or ""
+        preco_brl_val = get("preco_brl")
+        preco_brl_texto = get("preco_brl_texto") or get("preco_texto") or ""
         try:
             preco_brl = float(preco_brl_val) if preco_brl_val is not None else None
-        except Exception:
+        except (TypeError, ValueError):
             # Attempt to parse from text like "R$ 29,90"
-            preco_str = str(preco_brl_val or preco_brl_texto or "").replace("R$", "").replace(" ", "")
+            preco_str = _PRICE_RE.sub("", str(preco_brl_val or preco_brl_texto or ""))
             preco_str = preco_str.replace(".", "").replace(",", ".")
             try:
-                preco_brl = float(preco_str)
-            except Exception:
+                preco_brl = float(preco_str) if preco_str else None
+            except ValueError:
                 preco_brl = None
 
-        condicoes = p.get("condicoes") or []
+        condicoes = get("condicoes") or []
         if isinstance(condicoes, dict):
             condicoes = [condicoes]
         if not isinstance(condicoes, list):
             condicoes = []
 
-        normalized.append(
+        append(
             {
                 "marca_nome": marca_nome,
                 "marca": marca,
@@ -163,46 +310,161 @@ def extract_products_from_image(client, model: str, image_bytes: bytes, filename
     return normalized
 
 
+def extract_products_from_images(
+    client, model: str, batch: List[Tuple[str, bytes]], use_cache: bool = True
+) -> List[Tuple[str, List[Dict[str, Any]]]]:
+    # Várias imagens numa única chamada: K imagens pagam um só handshake e um só
+    # prompt de sistema (que ainda se beneficia do prompt-caching da OpenAI)
+    results: Dict[int, List[Dict[str, Any]]] = {}
+    pending: List[Tuple[int, str, bytes, str]] = []
+
+    for idx, (filename, image_bytes) in enumerate(batch):
+        cache_key = _cache_key(image_bytes, model)
+        if use_cache:
+            cached = _llm_cache.get(cache_key)
+            if cached is not None:
+                results[idx] = cached
+                continue
+        pending.append((idx, filename, image_bytes, cache_key))
+
+    if len(pending) == 1:
+        # Lote degenerado: o prompt single-image é mais simples e igualmente caro
+        idx, filename, image_bytes, _ = pending[0]
+        results[idx] = extract_products_from_image(client, model, image_bytes, filename, use_cache)
+    elif pending:
+        user_content: List[Dict[str, Any]] = [
+            {"type": "text", "text": "Extraia os produtos de cada imagem a seguir e retorne apenas o JSON."}
+        ]
+        for pos, (idx, filename, image_bytes, _) in enumerate(pending):
+            user_content.append({"type": "text", "text": f"Imagem source_index={pos} ({filename}):"})
+            user_content.append(_image_content_block(image_bytes, filename))
+
+        messages = [
+            {"role": "system", "content": INSTRUCTIONS_PT + "\n\n" + INSTRUCTIONS_BATCH_PT},
+            {"role": "user", "content": user_content},
+        ]
+
+        content = _stream_chat_content(client, model, messages)
+        payload = _json_loads(content) if content else {"results": []}
+
+        by_index: Dict[Any, List[Dict[str, Any]]] = {}
+        for item in payload.get("results", []) or []:
+            if type(item) is dict:
+                by_index[item.get("source_index")] = _normalize_products(item.get("products") or [])
+
+        for pos, (idx, filename, image_bytes, cache_key) in enumerate(pending):
+            normalized = by_index.get(pos)
+            if normalized is None:
+                # Resposta de lote incompleta: refaz esta imagem individualmente
+                normalized = extract_products_from_image(client, model, image_bytes, filename, use_cache)
+            elif use_cache and normalized:
+                _llm_cache.set(cache_key, normalized, expire=_LLM_CACHE_TTL_SECONDS)
+            results[idx] = normalized
+
+    return [(batch[i][0], results.get(i, [])) for i in range(len(batch))]
+
+
+def _extract_batch_from_spooled(
+    client, model: str, batch: List[Tuple[str, tempfile.SpooledTemporaryFile]], use_cache: bool
+) -> List[Tuple[str, List[Dict[str, Any]]]]:
+    # Materializa os bytes só dentro do worker: no máximo max_workers lotes em RAM por vez
+    materialized: List[Tuple[str, bytes]] = []
+    for filename, spooled in batch:
+        spooled.seek(0)
+        materialized.append((filename, spooled.read()))
+    return extract_products_from_images(client, model, materialized, use_cache)
+
+
+SAMPLE_DIR = "sample-data"
+
+
+def list_sample_images(sample_dir: str = SAMPLE_DIR) -> List[str]:
+    if not os.path.isdir(sample_dir):
+        return []
+    # scandir entrega DirEntry com .path pronto, sem o join por nome do listdir
+    with os.scandir(sample_dir) as it:
+        paths = [
+            entry.path
+            for entry in it
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in _MIME
+        ]
+    paths.sort()
+    return paths
+
+
+@st.cache_data(show_spinner=False)
+def _load_samples(sample_dir: str, fingerprint: Tuple[Tuple[str, float], ...]) -> List[Tuple[str, bytes]]:
+    # fingerprint (caminho, mtime) entra na chave do cache: religar a opção reaproveita
+    # os bytes já reduzidos, mas amostra alterada em disco força a releitura
+    samples: List[Tuple[str, bytes]] = []
+    for path in list_sample_images(sample_dir):
+        with open(path, "rb") as f:
+            data = f.read()
+        data, _ = downscale_image_for_llm(data)
+        samples.append((os.path.basename(path), data))
+    return samples
+
+
 def build_dataframe(rows: List[Tuple[str, Dict[str, Any]]]) -> pd.DataFrame:
-    records: List[Dict[str, Any]] = []
+    # Monta colunas diretamente em vez de uma lista de dicts + from_records:
+    # evita o passe de inferência de dtype por linha e o hashing de chaves repetidas
+    arquivo: List[str] = []
+    marca_nome: List[Optional[str]] = []
+    marca: List[Optional[str]] = []
+    produto: List[Optional[str]] = []
+    preco_brl: List[Optional[float]] = []
+    preco_brl_texto: List[Optional[str]] = []
+    condicoes_col: List[str] = []
+
     for filename, product in rows:
         condicoes = product.get("condicoes") or []
         if isinstance(condicoes, list):
+            # Generator direto no join; type(c) is dict evita a caminhada de MRO do isinstance
             condicoes_str = "; ".join(
-                [
-                    f"{(c.get('tipo') or 'outro')}: {c.get('valor') or ''}"
-                    for c in condicoes
-                    if isinstance(c, dict)
-                ]
+                f"{c.get('tipo', 'outro')}: {c.get('valor', '')}" for c in condicoes if type(c) is dict
             )
         else:
             condicoes_str = str(condicoes)
 
-        records.append(
-            {
-                "arquivo": filename,
-                "marca_nome": product.get("marca_nome"),
-                "marca": product.get("marca"),
-                "produto": product.get("produto"),
-                "preco_brl": product.get("preco_brl"),
-                "preco_brl_texto": product.get("preco_brl_texto"),
-                "condicoes": condicoes_str,
-            }
-        )
+        arquivo.append(filename)
+        marca_nome.append(product.get("marca_nome"))
+        marca.append(product.get("marca"))
+        produto.append(product.get("produto"))
+        preco_brl.append(product.get("preco_brl"))
+        preco_brl_texto.append(product.get("preco_brl_texto"))
+        condicoes_col.append(condicoes_str)
 
-    df = pd.DataFrame.from_records(records)
-    # Order columns
-    desired = [
-        "arquivo",
-        "marca_nome",
-        "marca",
-        "produto",
-        "preco_brl",
-        "preco_brl_texto",
-        "condicoes",
-    ]
-    df = df[[c for c in desired if c in df.columns]]
-    return df
+    # Ordem de inserção do dict já é a ordem desejada das colunas
+    return pd.DataFrame(
+        {
+            "arquivo": arquivo,
+            "marca_nome": marca_nome,
+            "marca": marca,
+            "produto": produto,
+            "preco_brl": pd.array(preco_brl, dtype="Float64"),
+            "preco_brl_texto": preco_brl_texto,
+            "condicoes": condicoes_col,
+        }
+    )
+
+
+@st.cache_resource(show_spinner=False)
+def _load_env_once() -> bool:
+    # Streamlit reexecuta o script inteiro a cada interação de widget;
+    # ler e parsear o .env uma vez por processo é suficiente
+    try:
+        load_dotenv(override=False)
+    except Exception:
+        pass
+    return True
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _cached_openai_client(api_key_hash: str, _api_key: str):
+    # Reusar o cliente entre execuções mantém o pool de conexões do httpx aquecido
+    # (keep-alive evita um handshake TLS de ~100-300ms por requisição).
+    # api_key_hash é a chave de cache; _api_key (underscore) fica fora do hash.
+    return OpenAI(api_key=_api_key, max_retries=3, timeout=httpx.Timeout(30.0, connect=5.0))
 
 
 def get_openai_client(api_key: Optional[str]):
@@ -211,15 +473,12 @@ def get_openai_client(api_key: Optional[str]):
     key = api_key or os.getenv("OPENAI_API_KEY")
     if not key:
         raise RuntimeError("Chave da OpenAI ausente. Informe a chave na UI ou via variável de ambiente OPENAI_API_KEY.")
-    return OpenAI(api_key=key)
+    return _cached_openai_client(hashlib.sha1(key.encode()).hexdigest(), key)
 
 
 def main() -> None:
-    # Carrega variáveis do .env se existir
-    try:
-        load_dotenv(override=False)
-    except Exception:
-        pass
+    # Carrega variáveis do .env se existir (uma vez por processo, não por rerun)
+    _load_env_once()
 
     st.set_page_config(page_title="Leitor de Ofertas (IA) - Lothus", layout="wide")
     st.title("Leitor de Ofertas com IA")
@@ -243,30 +502,61 @@ def main() -> None:
                 default_key = ""
         api_key = st.text_input("Chave da OpenAI", value=default_key, type="password", help="A chave não será exibida.")
         st.write(":lock: Modelo utilizado: gpt-5-nano")
+        use_cache = st.checkbox(
+            "Usar cache", value=True, help="Reaproveita respostas do modelo para imagens já processadas."
+        )
 
     st.subheader("Envio de imagens")
     uploaded_files = st.file_uploader(
         "Solte ou selecione imagens (JPG/PNG)", type=["jpg", "jpeg", "png"], accept_multiple_files=True
     )
+    sample_paths = list_sample_images()
+    use_samples = False
+    if sample_paths:
+        use_samples = st.checkbox(f"Carregar amostras de {SAMPLE_DIR}/ ({len(sample_paths)} imagens)", value=False)
 
-    images_to_process: List[Tuple[str, bytes]] = []
+    # (nome, bytes em spool, digest do conteúdo) — o digest deduplica imagens idênticas
+    images_to_process: List[Tuple[str, tempfile.SpooledTemporaryFile, bytes]] = []
     preview_columns = st.columns(4)
     col_idx = 0
 
     if uploaded_files:
         st.write(f"Imagens enviadas: {len(uploaded_files)}")
         for up in uploaded_files:
-            up_bytes = up.read()
-            up.seek(0)
-            images_to_process.append((up.name, up_bytes))
+            # Transborda uploads grandes para disco; só os workers materializam os bytes
+            buffer = up.getbuffer()
+            digest = hashlib.blake2b(buffer, digest_size=16).digest()
+            spooled = tempfile.SpooledTemporaryFile(max_size=_UPLOAD_SPOOL_MAX_BYTES)
+            spooled.write(buffer)
+            spooled.seek(0)
+            images_to_process.append((up.name, spooled, digest))
             try:
-                img = Image.open(io.BytesIO(up_bytes))
+                img = Image.open(spooled)
+                # Miniatura para preview: evita serializar a imagem em resolução cheia no Streamlit
+                img.thumbnail((256, 256))
                 with preview_columns[col_idx % 4]:
                     st.image(img, caption=up.name, use_column_width=True)
             except Exception:
                 pass
             col_idx += 1
 
+    if use_samples:
+        fingerprint = tuple((p, os.path.getmtime(p)) for p in sample_paths)
+        for name, data in _load_samples(SAMPLE_DIR, fingerprint):
+            digest = hashlib.blake2b(data, digest_size=16).digest()
+            spooled = tempfile.SpooledTemporaryFile(max_size=_UPLOAD_SPOOL_MAX_BYTES)
+            spooled.write(data)
+            spooled.seek(0)
+            images_to_process.append((name, spooled, digest))
+            try:
+                img = Image.open(spooled)
+                img.thumbnail((256, 256))
+                with preview_columns[col_idx % 4]:
+                    st.image(img, caption=name, use_column_width=True)
+            except Exception:
+                pass
+            col_idx += 1
+
     st.divider()
     run = st.button("Extrair dados", type="primary", use_container_width=True)
 
@@ -284,14 +574,53 @@ def main() -> None:
         model = "gpt-5-nano"
         collected: List[Tuple[str, Dict[str, Any]]] = []
 
-        for idx, (filename, img_bytes) in enumerate(images_to_process, start=1):
-            try:
-                products = extract_products_from_image(client, model, img_bytes, filename)
-                for p in products:
-                    collected.append((filename, p))
-            except Exception as ex:
-                st.error(f"Falha ao processar {filename}: {ex}")
-            progress.progress(idx / max(len(images_to_process), 1), text=f"Processado {idx}/{len(images_to_process)}")
+        _reset_usage_totals()
+        total = len(images_to_process)
+
+        # Colapsa imagens de conteúdo idêntico: só o representante vai à API e o
+        # resultado é replicado para todos os nomes de arquivo que o compartilham
+        unique: List[Tuple[bytes, str, tempfile.SpooledTemporaryFile]] = []
+        alias_names: Dict[bytes, List[str]] = {}
+        for filename, spooled, digest in images_to_process:
+            if digest not in alias_names:
+                alias_names[digest] = []
+                unique.append((digest, filename, spooled))
+            alias_names[digest].append(filename)
+        if len(unique) < total:
+            st.caption(f"{total - len(unique)} imagem(ns) duplicada(s) reaproveitando o mesmo resultado.")
+
+        batches = [unique[i : i + BATCH_SIZE] for i in range(0, len(unique), BATCH_SIZE)]
+        max_workers = min(8, len(batches))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(
+                    _extract_batch_from_spooled,
+                    client,
+                    model,
+                    [(filename, spooled) for _, filename, spooled in batch],
+                    use_cache,
+                ): batch
+                for batch in batches
+            }
+            done = 0
+            for fut in concurrent.futures.as_completed(futures):
+                batch = futures[fut]
+                try:
+                    for (digest, _, _), (_, products) in zip(batch, fut.result()):
+                        for filename in alias_names[digest]:
+                            for p in products:
+                                collected.append((filename, p))
+                except Exception as ex:
+                    filenames = [filename for _, filename, _ in batch]
+                    st.error(f"Falha ao processar {', '.join(filenames)}: {ex}")
+                done += sum(len(alias_names[digest]) for digest, _, _ in batch)
+                progress.progress(done / total, text=f"Processado {done}/{total}")
+
+        with _usage_lock:
+            prompt_tokens = _usage_totals["prompt_tokens"]
+            cached_tokens = _usage_totals["cached_tokens"]
+        if prompt_tokens:
+            st.sidebar.caption(f"Tokens de prompt: {prompt_tokens} (reaproveitados do cache: {cached_tokens})")
 
         if not collected:
             st.info("Nenhum produto encontrado nas imagens enviadas.")
@@ -301,7 +630,10 @@ def main() -> None:
         st.subheader("Resultados")
         st.dataframe(df, use_container_width=True)
 
-        csv_bytes = df.to_csv(index=False).encode("utf-8")
+        # Escreve UTF-8 direto no buffer: evita materializar o CSV como str e re-encodar
+        csv_buf = io.BytesIO()
+        df.to_csv(csv_buf, index=False, encoding="utf-8", lineterminator="\n")
+        csv_bytes = csv_buf.getvalue()
         st.download_button(
             label="Baixar CSV",
             data=csv_bytes,